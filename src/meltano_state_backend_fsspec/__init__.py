@@ -4,6 +4,7 @@ from .manager import FSSpecStateStoreManager as FSSpecStateStoreManager
 from .settings import AZURE_ACCOUNT_KEY as AZURE_ACCOUNT_KEY
 from .settings import AZURE_ACCOUNT_NAME as AZURE_ACCOUNT_NAME
 from .settings import AZURE_CONNECTION_STRING as AZURE_CONNECTION_STRING
+from .settings import CACHE_READS as CACHE_READS
 from .settings import GCS_ENDPOINT_URL as GCS_ENDPOINT_URL
 from .settings import GCS_PROJECT as GCS_PROJECT
 from .settings import GCS_TOKEN as GCS_TOKEN
@@ -8,6 +8,16 @@ PROTOCOL = SettingDefinition(
     kind=SettingKind.STRING,
 )
 
+CACHE_READS = SettingDefinition(
+    name="state_backend.fs.cache_reads",
+    description=(
+        "Whether to keep read state in memory, and only fetch it again when the "
+        "state file has changed."
+    ),
+    kind=SettingKind.BOOLEAN,
+    value=False,
+)
+
 STORAGE_OPTIONS = SettingDefinition(
     name="state_backend.fs.storage_options",
     description="The storage options to use.",
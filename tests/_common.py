@@ -0,0 +1,154 @@
+"""Tests shared by every backend's test module.
+
+Each backend module imports the tests it runs, and provides the ``manager``
+fixture they use.
+"""
+
+from __future__ import annotations
+
+import unittest.mock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from meltano.core.state_store import MeltanoState
+
+    from meltano_state_backend_fsspec import FSSpecStateStoreManager
+
+
+def test_set_state(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test setting state."""
+    state = state_factory("test_job")
+    manager.set(state)
+    assert manager.get_state_file(state.state_id).read_text() == state.json()
+
+
+def test_get_state(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test getting state."""
+    state = state_factory("test_job")
+    assert manager.get(state.state_id) is None
+
+    manager.mkdir(state.state_id)
+    manager.get_state_file(state.state_id).write_text(state.json())
+    assert manager.get(state.state_id) == state
+
+
+def test_delete_state(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test deleting state."""
+    state = state_factory("test_job")
+    manager.delete(state.state_id)
+
+    state_file = manager.get_state_file(state.state_id)
+    manager.set(state)
+    assert state_file.exists()
+
+    manager.delete(state.state_id)
+    assert manager.get(state.state_id) is None
+    assert not state_file.exists()
+
+
+def test_get_state_ids(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test getting state ids."""
+    state1 = state_factory("test_job1")
+    state2 = state_factory("test_job2")
+    assert manager.set_many([state1, state2]) == 2
+    assert manager.get_state_ids() == ["test_job1", "test_job2"]
+
+
+def test_get_state_ids_with_pattern(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test getting state ids with pattern."""
+    state11 = state_factory("test_job11")
+    state12 = state_factory("test_job12")
+    state21 = state_factory("test_job21")
+    assert manager.set_many([state11, state12, state21]) == 3
+    assert manager.get_state_ids() == ["test_job11", "test_job12", "test_job21"]
+    assert manager.get_state_ids(pattern="test_job1*") == ["test_job11", "test_job12"]
+    assert manager.get_state_ids(pattern="test_job2*") == ["test_job21"]
+
+
+def test_clear_all(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    state1 = state_factory("test_job1")
+    state2 = state_factory("test_job2")
+    assert manager.set_many([state1, state2]) == 2
+    assert manager.get_state_ids() == ["test_job1", "test_job2"]
+
+    assert manager.clear_all() == 2
+    assert manager.get_state_ids() == []
+
+
+def test_acquire_lock(manager: FSSpecStateStoreManager) -> None:
+    """Test acquiring lock."""
+    state_id = "test_job"
+
+    # Only mock the manager's clock, as skewing the system clock breaks request
+    # signing on object stores
+    mock_time = 1000.0
+
+    def mock_utc_now() -> float:
+        return mock_time
+
+    with (
+        unittest.mock.patch(
+            "meltano_state_backend_fsspec.manager._utc_now",
+            side_effect=mock_utc_now,
+        ),
+        manager.acquire_lock(state_id, retry_seconds=5),
+    ):
+        assert manager.is_locked(state_id)
+
+        # Beyond the 60 second lock timeout
+        mock_time += 80
+        assert not manager.is_locked(state_id)
+
+    assert not manager.is_locked(state_id)
+
+
+def test_acquire_lock_retry(manager: FSSpecStateStoreManager) -> None:
+    """Test that lock acquisition retries when lock is held."""
+    state_id = "test_job"
+    retry_seconds = 10
+
+    # Mock is_locked to return True for first 5 calls, then False
+    call_count = 0
+    original_is_locked = manager.is_locked
+
+    def mock_is_locked(state_id: str) -> bool:
+        nonlocal call_count
+        call_count += 1
+        if call_count <= 5:
+            return True
+        return original_is_locked(state_id)
+
+    with (
+        unittest.mock.patch.object(manager, "is_locked", side_effect=mock_is_locked),
+        unittest.mock.patch("meltano_state_backend_fsspec.manager.sleep") as mock_sleep,
+        manager.acquire_lock(state_id, retry_seconds=retry_seconds),
+    ):
+        pass
+
+    # Verify sleep was called 5 times (once for each time is_locked returned True)
+    assert mock_sleep.call_count == 5
+
+    # Delays double from retry_seconds up to half the lock timeout, with jitter
+    delays = [call[0][0] for call in mock_sleep.call_args_list]
+    for delay, expected in zip(delays, (10, 20, 30, 30, 30), strict=True):
+        assert expected * 0.8 <= delay <= expected * 1.2
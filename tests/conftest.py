@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from functools import cache
+from typing import TYPE_CHECKING
+
+import pytest
+from meltano.core.state_store import MeltanoState
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+@pytest.fixture(scope="session")
+def state_factory() -> Callable[[str], MeltanoState]:
+    """Build the canonical test state for a state_id, once per session."""
+
+    @cache
+    def make_state(state_id: str) -> MeltanoState:
+        return MeltanoState(
+            state_id=state_id,
+            partial_state={"singer_state": {"partial": 1}},
+            completed_state={"singer_state": {"complete": 1}},
+        )
+
+    return make_state
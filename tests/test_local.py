@@ -1,8 +1,16 @@
 import unittest.mock
+from collections.abc import Callable
 from pathlib import Path
 
 import pytest
-import time_machine
+from _common import (  # noqa: F401
+    test_acquire_lock,
+    test_acquire_lock_retry,
+    test_clear_all,
+    test_delete_state,
+    test_get_state,
+    test_set_state,
+)
 from meltano.core.state_store import MeltanoState
 
 from meltano_state_backend_fsspec import FSSpecStateStoreManager
@@ -17,146 +25,263 @@ def manager(tmp_path: Path) -> FSSpecStateStoreManager:
     )
 
 
-def test_set_state(manager: FSSpecStateStoreManager) -> None:
-    """Test setting state."""
-    # Test setting new state
-    state = MeltanoState(
-        state_id="test_job",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
+def test_get_state_cached(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that cached reads only fetch state files that have changed."""
+    manager = FSSpecStateStoreManager(
+        uri=f"fs://{tmp_path}",
+        protocol="file",
+        storage_options={},
+        cache_reads=True,
     )
-    manager.set(state)
-    assert manager.get_state_file(state.state_id).read_text() == state.json()
-
-
-def test_get_state(manager: FSSpecStateStoreManager) -> None:
-    """Test getting state."""
     state = MeltanoState(
         state_id="test_job",
-        partial_state={"singer_state": {"partial": 1}},
+        partial_state={},
         completed_state={"singer_state": {"complete": 1}},
     )
+    other = MeltanoState(
+        state_id="other_job",
+        partial_state={},
+        completed_state={"singer_state": {"complete": 2}},
+    )
     assert manager.get(state.state_id) is None
+    manager.set(state)
+    manager.set(other)
 
-    manager.mkdir(state.state_id)
-    manager.get_state_file(state.state_id).write_text(state.json())
-    assert manager.get(state.state_id) == state
+    with unittest.mock.patch.object(
+        manager.fs,
+        "cat_file",
+        wraps=manager.fs.cat_file,
+    ) as cat_file:
+        assert manager.get(state.state_id) == state
+        assert manager.get(state.state_id) == state
+        assert cat_file.call_count == 1
 
+        # The state file was changed by someone else, after it was listed
+        assert manager.get_state_ids() == ["other_job", "test_job"]
+        changed = MeltanoState(
+            state_id="test_job",
+            partial_state={},
+            completed_state={"singer_state": {"complete": 100}},
+        )
+        manager.get_state_file(state.state_id).write_text(changed.json())
+        assert manager.get(state.state_id) == changed
+        assert cat_file.call_count == 2
 
-def test_delete_state(manager: FSSpecStateStoreManager) -> None:
-    """Test deleting state."""
-    state = MeltanoState(
-        state_id="test_job",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
-    )
-    state_file = manager.get_state_file(state.state_id)
-    manager.set(state)
-    assert state_file.exists()
+        # The least recently read state is evicted
+        monkeypatch.setattr("meltano_state_backend_fsspec.manager._READ_CACHE_SIZE", 1)
+        assert manager.get(other.state_id) == other
+        assert manager.get(state.state_id) == changed
+        assert cat_file.call_count == 4
 
     manager.delete(state.state_id)
     assert manager.get(state.state_id) is None
-    assert not state_file.exists()
 
 
-def test_get_state_ids(manager: FSSpecStateStoreManager) -> None:
-    """Test getting state ids."""
-    state1 = MeltanoState(
-        state_id="test_job1",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
+def test_delete_many(manager: FSSpecStateStoreManager) -> None:
+    """Test deleting state for several state ids."""
+    states = [
+        MeltanoState(
+            state_id=f"test_job{i}",
+            partial_state={},
+            completed_state={"singer_state": {"complete": i}},
+        )
+        for i in range(3)
+    ]
+    assert manager.set_many(states) == 3
+    assert manager.get("test_job1") == states[1]
+
+    manager.delete_many(["test_job0", "test_job1", "missing_job"])
+    assert manager.get_state_ids() == ["test_job2"]
+    assert sorted(path.name for path in manager.path.iterdir()) == ["test_job2"]
+
+
+def test_set_many_creates_missing_directories(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test that directories are only created for states written the first time."""
+    existing = state_factory("test_job1")
+    assert manager.set_many([existing]) == 1
+
+    new = state_factory("test_job2")
+    with unittest.mock.patch.object(
+        manager,
+        "mkdir",
+        wraps=manager.mkdir,
+    ) as mock_mkdir:
+        assert manager.set_many([existing, new]) == 2
+
+    mock_mkdir.assert_called_once_with("test_job2")
+    assert manager.get("test_job1") == existing
+    assert manager.get("test_job2") == new
+
+
+SEED_STATE_IDS = ("test_job11", "test_job12", "test_job21")
+
+
+@pytest.fixture(scope="module")
+def seeded_manager(
+    tmp_path_factory: pytest.TempPathFactory,
+    state_factory: Callable[[str], MeltanoState],
+) -> FSSpecStateStoreManager:
+    """A manager with state already written, for tests that don't modify it."""
+    manager = FSSpecStateStoreManager(
+        uri=f"fs://{tmp_path_factory.mktemp('seed')}",
+        protocol="file",
+        storage_options={},
     )
-    state2 = MeltanoState(
-        state_id="test_job2",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
+    states = [state_factory(state_id) for state_id in SEED_STATE_IDS]
+    assert manager.set_many(states) == len(SEED_STATE_IDS)
+    return manager
+
+
+def test_get_state_ids(seeded_manager: FSSpecStateStoreManager) -> None:
+    """Test getting state ids."""
+    assert seeded_manager.get_state_ids() == list(SEED_STATE_IDS)
+
+
+def test_get_state_ids_missing_root(tmp_path: Path) -> None:
+    """Test getting state ids before any state was written."""
+    manager = FSSpecStateStoreManager(
+        uri=f"fs://{tmp_path / 'missing'}",
+        protocol="file",
+        storage_options={},
     )
-    manager.set(state1)
-    manager.set(state2)
-    assert manager.get_state_ids() == ["test_job1", "test_job2"]
+    assert manager.get_state_ids() == []
+    assert manager.clear_all() == 0
+
 
+def test_get_state_ids_without_state_file(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test that state ids without a state file are not listed."""
+    state = state_factory("test_job1")
+    manager.set(state)
+    with manager.acquire_lock("test_job2", retry_seconds=1):
+        assert manager.get_state_ids() == ["test_job1"]
 
-def test_get_state_ids_with_pattern(manager: FSSpecStateStoreManager) -> None:
+
+def test_get_state_ids_with_pattern(seeded_manager: FSSpecStateStoreManager) -> None:
     """Test getting state ids with pattern."""
-    state11 = MeltanoState(
-        state_id="test_job11",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
-    )
-    state12 = MeltanoState(
-        state_id="test_job12",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
-    )
-    state21 = MeltanoState(
-        state_id="test_job21",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
-    )
-    manager.set(state11)
-    manager.set(state12)
-    manager.set(state21)
+    manager = seeded_manager
     assert manager.get_state_ids(pattern="test_job1*") == ["test_job11", "test_job12"]
     assert manager.get_state_ids(pattern="test_job2*") == ["test_job21"]
+    assert manager.get_state_ids(pattern="test_job[12]1") == [
+        "test_job11",
+        "test_job21",
+    ]
+    assert manager.get_state_ids(pattern="test_job1") == []
 
 
-def test_clear_all(manager: FSSpecStateStoreManager) -> None:
-    state1 = MeltanoState(
-        state_id="test_job1",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
-    )
-    state2 = MeltanoState(
-        state_id="test_job2",
-        partial_state={"singer_state": {"partial": 1}},
-        completed_state={"singer_state": {"complete": 1}},
-    )
-    manager.set(state1)
-    manager.set(state2)
-    assert manager.get_state_ids() == ["test_job1", "test_job2"]
+def test_clear_all_removes_directories(
+    manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    """Test that clearing all state also removes the state_id directories."""
+    assert manager.set_many([state_factory("test_job1")]) == 1
+    assert manager.clear_all() == 1
+    assert list(manager.path.iterdir()) == []
 
-    manager.clear_all()
-    assert manager.get_state_ids() == []
 
-
-def test_acquire_lock(manager: FSSpecStateStoreManager) -> None:
-    """Test acquiring lock."""
+def test_is_locked_text_timestamp(manager: FSSpecStateStoreManager) -> None:
+    """Test reading a lock file written by an earlier version."""
     state_id = "test_job"
-    with (
-        time_machine.travel("2025-01-01 00:00:00", tick=False) as traveller,
-        manager.acquire_lock(state_id, retry_seconds=5),
+    manager.mkdir(state_id)
+    manager.path.joinpath(state_id, "lock").write_text("1735689600.0")
+
+    with unittest.mock.patch(
+        "meltano_state_backend_fsspec.manager._utc_now",
+        return_value=1735689600.0 + 30,
     ):
         assert manager.is_locked(state_id)
 
-        traveller.shift(80)
-        assert not manager.is_locked(state_id)
-
-    assert not manager.is_locked(state_id)
 
-
-def test_acquire_lock_retry(manager: FSSpecStateStoreManager) -> None:
-    """Test that lock acquisition retries when lock is held."""
+def test_acquire_lock_taken_after_check(manager: FSSpecStateStoreManager) -> None:
+    """Test that a lock taken between checking and writing it is not overwritten."""
     state_id = "test_job"
-    retry_seconds = 10
+    manager.mkdir(state_id)
+    lock_file = manager.path.joinpath(state_id, "lock")
+    lock_file.write_text("0")
 
-    # Mock is_locked to return True for first 5 calls, then False
+    # Make the first check miss the (stale) lock file
     call_count = 0
     original_is_locked = manager.is_locked
 
     def mock_is_locked(state_id: str) -> bool:
         nonlocal call_count
         call_count += 1
-        if call_count <= 5:
-            return True
+        if call_count == 1:
+            return False
         return original_is_locked(state_id)
 
     with (
         unittest.mock.patch.object(manager, "is_locked", side_effect=mock_is_locked),
         unittest.mock.patch("meltano_state_backend_fsspec.manager.sleep") as mock_sleep,
-        manager.acquire_lock(state_id, retry_seconds=retry_seconds),
+        manager.acquire_lock(state_id, retry_seconds=1),
+    ):
+        assert lock_file.read_bytes() != b"0"
+
+    # Writing the lock failed, so it was checked again after backing off, which
+    # cleared the stale lock
+    assert call_count == 2
+    assert mock_sleep.call_count == 1
+    assert not lock_file.exists()
+
+
+def test_acquire_lock_backs_off_after_lost_create(
+    manager: FSSpecStateStoreManager,
+) -> None:
+    """Test that failing to create the lock file backs off before retrying."""
+    state_id = "test_job"
+    manager.mkdir(state_id)
+    lock_file = manager.path.joinpath(state_id, "lock")
+    lock_file.write_text("0")
+
+    delays: list[float] = []
+
+    def mock_sleep(delay: float) -> None:
+        delays.append(delay)
+        # The stale lock can't be removed, until another process gets to it
+        if len(delays) == 3:
+            lock_file.unlink()
+
+    with (
+        unittest.mock.patch("meltano_state_backend_fsspec.manager._rm_file"),
+        unittest.mock.patch(
+            "meltano_state_backend_fsspec.manager.sleep",
+            side_effect=mock_sleep,
+        ),
+        manager.acquire_lock(state_id, retry_seconds=10),
+    ):
+        assert lock_file.read_bytes() != b"0"
+
+    for delay, expected in zip(delays, (10, 20, 30), strict=True):
+        assert expected * 0.8 <= delay <= expected * 1.2
+
+
+def test_acquire_lock_error_keeps_other_lock(
+    manager: FSSpecStateStoreManager,
+) -> None:
+    """Test that failing to write the lock file doesn't remove another's lock."""
+    state_id = "test_job"
+    manager.mkdir(state_id)
+    lock_file = manager.path.joinpath(state_id, "lock")
+
+    def write_new_file(path: str, _: bytes) -> None:
+        # Another process takes the lock, and writing ours fails unexpectedly
+        lock_file.write_text("9999999999")
+        raise PermissionError(path)
+
+    with (
+        unittest.mock.patch.object(
+            manager,
+            "_write_new_file",
+            side_effect=write_new_file,
+        ),
+        pytest.raises(PermissionError),
+        manager.acquire_lock(state_id, retry_seconds=1),
     ):
-        pass
+        pass  # pragma: no cover
 
-    # Verify sleep was called 5 times (once for each time is_locked returned True)
-    assert mock_sleep.call_count == 5
-    assert all(call[0][0] == retry_seconds for call in mock_sleep.call_args_list)
+    assert lock_file.read_text() == "9999999999"
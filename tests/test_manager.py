@@ -1,14 +1,58 @@
+import asyncio
+import io
+import os
 import shutil
+import subprocess
+import sys
+import unittest.mock
+import uuid
+from collections.abc import Callable
+from contextlib import AbstractContextManager
 from pathlib import Path
+from typing import Any
 
 import pytest
+from botocore.exceptions import ClientError
+from fsspec.asyn import get_loop
 from meltano.core.project import Project
-from meltano.core.state_store import state_store_manager_from_project_settings
+from meltano.core.state_store import (
+    MeltanoState,
+    state_store_manager_from_project_settings,
+)
+from paramiko.ecdsakey import ECDSAKey
+from paramiko.rsakey import RSAKey
 from upath.implementations.cloud import AzurePath, GCSPath, S3Path
 from upath.implementations.local import LocalPath
 from upath.implementations.sftp import SFTPPath
 
 from meltano_state_backend_fsspec import FSSpecStateStoreManager
+from meltano_state_backend_fsspec.manager import (
+    _RM_CONCURRENCY,
+    JSON_UPLOAD_OPTIONS,
+    OBJECT_STORE_PROTOCOLS,
+    _load_private_key,
+    _rm_files,
+)
+
+
+@pytest.fixture
+def s3_manager() -> FSSpecStateStoreManager:
+    """An S3 manager for tests that don't reach the network."""
+    return FSSpecStateStoreManager(
+        uri="fs://my-bucket/path/to/state",
+        protocol="s3",
+        storage_options={},
+    )
+
+
+def _mock_filesystem(fs: unittest.mock.Mock) -> AbstractContextManager[Any]:
+    """Have every manager use the given mock as its filesystem."""
+    return unittest.mock.patch.object(
+        FSSpecStateStoreManager,
+        "fs",
+        new_callable=unittest.mock.PropertyMock,
+        return_value=fs,
+    )
 
 
 def test_manager() -> None:
@@ -21,24 +65,301 @@ def test_manager() -> None:
     assert manager.path.as_uri() == "file:///tmp/test"
 
 
-def test_s3_protocol() -> None:
+def test_s3_protocol(s3_manager: FSSpecStateStoreManager) -> None:
+    assert s3_manager.path.protocol == "s3"
+    assert s3_manager.path.as_uri() == "s3://my-bucket/path/to/state"
+
+
+def test_storage_options_for_protocol() -> None:
+    manager = FSSpecStateStoreManager(
+        uri="fs://container/path/to/state",
+        protocol="azure",
+        storage_options={
+            "azure.account_name": "my-account-name",
+            "abfs.account_key": "my-account-key",
+            "s3.key": "my_key",
+        },
+    )
+    assert manager.storage_options == {
+        "account_name": "my-account-name",
+        "account_key": "my-account-key",
+    }
+
+
+def test_filesystem_is_shared() -> None:
+    managers = [
+        FSSpecStateStoreManager(
+            uri="fs://my-bucket/path/to/state",
+            protocol="s3",
+            storage_options={"s3.key": "my_key", "s3.secret": "my_secret"},
+        )
+        for _ in range(2)
+    ]
+    assert managers[0].fs is managers[1].fs
+
+
+def test_filesystem_not_shared_after_fork() -> None:
+    def make_manager() -> FSSpecStateStoreManager:
+        return FSSpecStateStoreManager(
+            uri="fs://my-bucket/path/to/state",
+            protocol="s3",
+            storage_options={"s3.key": "my_key", "s3.secret": "my_secret"},
+        )
+
+    fs = make_manager().fs
+    with unittest.mock.patch("fsspec.spec.os.getpid", return_value=os.getpid() + 1):
+        assert make_manager().fs is not fs
+
+
+def test_filesystem_skip_instance_cache() -> None:
+    storage_options = {"s3.key": "my_key", "s3.skip_instance_cache": True}
+    managers = [
+        FSSpecStateStoreManager(
+            uri="fs://my-bucket/path/to/state",
+            protocol="s3",
+            storage_options=storage_options,
+        )
+        for _ in range(2)
+    ]
+    assert managers[0].fs is not managers[1].fs
+
+
+def test_path_uses_shared_filesystem(tmp_path: Path) -> None:
+    manager = FSSpecStateStoreManager(
+        uri=f"fs://{tmp_path}",
+        protocol="file",
+        storage_options={},
+    )
+    assert manager.get_state_file("test_job").fs is manager.fs
+    assert manager.path.fs is manager.fs
+
+
+def test_filesystem_unhashable_options() -> None:
     manager = FSSpecStateStoreManager(
         uri="fs://my-bucket/path/to/state",
         protocol="s3",
-        storage_options={},
+        storage_options={"s3.client_kwargs": {"region_name": "us-east-1"}},
     )
-    assert manager.path.protocol == "s3"
-    assert manager.path.as_uri() == "s3://my-bucket/path/to/state"
+    assert manager.fs.storage_options == {"client_kwargs": {"region_name": "us-east-1"}}
 
 
-@pytest.fixture
-def project(tmp_path: Path) -> Project:
-    path = tmp_path / "project"
+def test_get_state_ids_object_store_prefix(s3_manager: FSSpecStateStoreManager) -> None:
+    files = [
+        "my-bucket/path/to/state/test_job11/state.json",
+        "my-bucket/path/to/state/test_job12/lock",
+    ]
+    with unittest.mock.patch.object(s3_manager.fs, "find", return_value=files) as find:
+        assert s3_manager.get_state_ids(pattern="test_job1*") == ["test_job11"]
+    find.assert_called_once_with(
+        "my-bucket/path/to/state",
+        withdirs=False,
+        prefix="test_job1",
+    )
+
+
+def test_set_object_store_single_put(
+    s3_manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    state = state_factory("test_job")
+    with (
+        unittest.mock.patch.object(s3_manager.fs, "mkdir") as mock_mkdir,
+        unittest.mock.patch.object(s3_manager.fs, "pipe_file") as mock_pipe_file,
+        unittest.mock.patch.object(s3_manager.fs, "open") as mock_open,
+    ):
+        s3_manager.set(state)
+
+    # The bucket is created if missing, before the first write
+    mock_mkdir.assert_called_once_with("my-bucket/path/to/state", create_parents=True)
+
+    mock_open.assert_not_called()
+    mock_pipe_file.assert_called_once_with(
+        "my-bucket/path/to/state/test_job/state.json",
+        state.json().encode(),
+        ContentType="application/json",
+    )
+
+
+def test_json_upload_options_cover_object_stores() -> None:
+    assert JSON_UPLOAD_OPTIONS.keys() == OBJECT_STORE_PROTOCOLS
+
+
+def test_get_cached_object_store_bypasses_listings_cache(
+    s3_manager: FSSpecStateStoreManager,
+    state_factory: Callable[[str], MeltanoState],
+) -> None:
+    s3_manager.cache_reads = True
+    state = state_factory("test_job")
+    fs = unittest.mock.Mock()
+    fs.info.return_value = {"size": 1, "ETag": '"etag"'}
+    fs.cat_file.return_value = state.json().encode()
+    with _mock_filesystem(fs):
+        assert s3_manager.get(state.state_id) == state
+
+    path = "my-bucket/path/to/state/test_job/state.json"
+    assert fs.mock_calls[:2] == [
+        unittest.mock.call.invalidate_cache(path),
+        unittest.mock.call.info(path),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("code", "status"),
+    (
+        pytest.param("ConditionalRequestConflict", 409, id="conflict"),
+        pytest.param("PreconditionFailed", 412, id="precondition-failed"),
+    ),
+)
+def test_acquire_lock_object_store_write_conflict(
+    s3_manager: FSSpecStateStoreManager,
+    code: str,
+    status: int,
+) -> None:
+    response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+    conflict = OSError("Conflict")
+    conflict.__cause__ = ClientError(response, "PutObject")  # type: ignore[no-untyped-call]
+
+    fs = unittest.mock.Mock()
+    fs.cat_file.side_effect = FileNotFoundError
+    fs.pipe_file.side_effect = [conflict, None]
+    with (
+        _mock_filesystem(fs),
+        unittest.mock.patch("meltano_state_backend_fsspec.manager.sleep") as mock_sleep,
+        s3_manager.acquire_lock("test_job", retry_seconds=1),
+    ):
+        fs.rm_file.assert_not_called()
+
+    assert mock_sleep.call_count == 1
+    fs.rm_file.assert_called_once_with("my-bucket/path/to/state/test_job/lock")
+
+
+def test_rm_files_async_filesystem() -> None:
+    active = 0
+    max_active = 0
+
+    async def rm_file(path: str) -> None:
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0)
+        active -= 1
+        if path.endswith("missing"):
+            raise FileNotFoundError(path)
+
+    mock_rm_file = unittest.mock.Mock(side_effect=rm_file)
+    fs = unittest.mock.Mock(
+        async_impl=True,
+        loop=get_loop(),  # type: ignore[no-untyped-call]
+        _rm_file=mock_rm_file,
+    )
+    paths = [f"bucket/file{i}" for i in range(_RM_CONCURRENCY * 3)] + ["bucket/missing"]
+    _rm_files(fs, paths)
+
+    assert mock_rm_file.call_count == len(paths)
+    assert max_active == _RM_CONCURRENCY
+    fs.rm_file.assert_not_called()
+
+    mock_rm_file.reset_mock()
+    _rm_files(fs, [])
+    mock_rm_file.assert_not_called()
+
+
+def test_mkdir_object_store(s3_manager: FSSpecStateStoreManager) -> None:
+    with unittest.mock.patch.object(s3_manager.fs, "mkdir") as mock_mkdir:
+        s3_manager.mkdir("test_job")
+        s3_manager.mkdir("other_job")
+    # Only the bucket is created, without a placeholder for each state_id
+    mock_mkdir.assert_called_once_with("my-bucket/path/to/state", create_parents=True)
+
+
+def test_paramiko_imported_only_for_private_keys() -> None:
+    code = """
+import sys
+from meltano_state_backend_fsspec import FSSpecStateStoreManager
+
+FSSpecStateStoreManager(
+    uri="fs:///upload/test",
+    protocol="sftp",
+    storage_options={"sftp.host": "localhost", "sftp.password": "secret"},
+)
+assert "paramiko" not in sys.modules
+"""
+    subprocess.run([sys.executable, "-c", code], check=True)  # noqa: S603
+
+
+@pytest.mark.parametrize(
+    ("key_class", "bits"),
+    (
+        pytest.param(RSAKey, 2048, id="rsa"),
+        pytest.param(ECDSAKey, 256, id="ecdsa"),
+    ),
+)
+def test_sftp_private_key_is_parsed_once(
+    key_class: type[RSAKey | ECDSAKey],
+    bits: int,
+) -> None:
+    buffer = io.StringIO()
+    key_class.generate(bits=bits).write_private_key(buffer)
+    storage_options = {"sftp.host": "localhost", "sftp.pkey": buffer.getvalue()}
+    manager1 = FSSpecStateStoreManager(
+        uri="fs:///upload/test",
+        protocol="sftp",
+        storage_options=storage_options,
+    )
+    manager2 = FSSpecStateStoreManager(
+        uri="fs:///upload/test",
+        protocol="sftp",
+        storage_options=storage_options,
+    )
+    assert isinstance(manager1.storage_options["pkey"], key_class)
+    assert manager1.storage_options["pkey"] is manager2.storage_options["pkey"]
+
+
+def test_sftp_invalid_private_key_is_parsed_once() -> None:
+    storage_options = {"sftp.host": "localhost", "sftp.pkey": f"invalid {uuid.uuid4()}"}
+    misses = _load_private_key.cache_info().misses
+    for _ in range(2):
+        with pytest.raises(ValueError, match="not in a valid format"):
+            FSSpecStateStoreManager(
+                uri="fs:///upload/test",
+                protocol="sftp",
+                storage_options=storage_options,
+            )
+    assert _load_private_key.cache_info().misses == misses + 1
+
+
+def _link_file(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:  # e.g. across devices
+        shutil.copyfile(src, dst)
+
+
+def _link_tree(src: Path, dst: Path) -> None:
+    """Recreate the src tree in dst, hard linking files instead of copying them."""
+    for dirpath, _, filenames in os.walk(src):
+        target = dst / Path(dirpath).relative_to(src)
+        target.mkdir(parents=True, exist_ok=True)
+        for filename in filenames:
+            _link_file(Path(dirpath, filename), target / filename)
+
+
+@pytest.fixture(scope="session")
+def project_template(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    # Copied once per session, so that tests linking to it can't modify the fixture
+    path = tmp_path_factory.mktemp("template") / "project"
     shutil.copytree(
         "fixtures/project",
         path,
         ignore=shutil.ignore_patterns(".meltano/**"),
     )
+    return path
+
+
+@pytest.fixture
+def project(tmp_path: Path, project_template: Path) -> Project:
+    path = tmp_path / "project"
+    _link_tree(project_template, path)
     return Project.find(path.resolve())  # type: ignore[no-any-return]
 
 